@@ -0,0 +1,188 @@
+import os
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+# Ниже этого количества строк обычный groupby pandas быстрее, чем запуск процессов
+PARALLEL_THRESHOLD = 2_000_000
+
+_executor = None
+
+
+def get_executor():
+    """Пул процессов создаётся один раз и переиспользуется между вызовами"""
+    global _executor
+    if _executor is None:
+        _executor = ProcessPoolExecutor(max_workers=os.cpu_count())
+    return _executor
+
+
+def to_shared(array):
+    """Копирование массива в разделяемую память; возвращает блок и его описание для процессов"""
+    shm = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+    np.ndarray(array.shape, dtype=array.dtype, buffer=shm.buf)[:] = array
+    return shm, (shm.name, array.shape, array.dtype.str)
+
+
+def read_shared(spec, start, stop):
+    """Копия строк [start, stop) массива из разделяемой памяти"""
+    shm = shared_memory.SharedMemory(name=spec[0])
+    array = np.ndarray(spec[1], dtype=spec[2], buffer=shm.buf)
+    part = array[start:stop].copy()
+    # Представление на буфер нужно отпустить до закрытия блока
+    del array
+    shm.close()
+    return part
+
+
+def period_ordinals(timestamps, period):
+    """Номер дня, недели или месяца для datetime64[ns] в виде int64"""
+    if period == 'M':
+        return timestamps.astype('datetime64[M]').astype(np.int64)
+    days = timestamps.astype('datetime64[D]').astype(np.int64)
+    if period == 'W':
+        # 1970-01-01 четверг, недели W-SUN начинаются с понедельника
+        return (days + 3) // 7
+    return days
+
+
+def partial_aggregate(key_specs, values_spec, start, stop, dropna, period):
+    """Частичные суммы и количества по группам для строк [start, stop) одной партиции"""
+    keys = [read_shared(spec, start, stop) for spec in key_specs]
+    if period is not None:
+        timestamps = keys[0].view('datetime64[ns]')
+        valid = ~np.isnat(timestamps)
+        keys = [period_ordinals(timestamps[valid], period)]
+    if values_spec is not None:
+        values = read_shared(values_spec, start, stop)
+        if period is not None:
+            values = values[valid]
+    else:
+        values = np.zeros(len(keys[0]), dtype=np.int8)
+
+    # Суммы считает pandas, поэтому целые складываются в int64 без потери точности
+    grouped = pd.Series(values).groupby(keys if len(keys) > 1 else keys[0], dropna=dropna)
+    return pd.DataFrame({'sum': grouped.sum(), 'count': grouped.size()})
+
+
+def aggregate_parallel(key_arrays, values, dropna=True, period=None):
+    """Суммы и количества по группам на пуле процессов.
+
+    Таблица делится на непрерывные диапазоны строк, для отсортированных
+    по дате таблиц это диапазоны по времени. Каждый процесс группирует
+    свою партицию сам, в основном процессе складываются только
+    частичные результаты.
+    """
+    blocks = []
+    try:
+        key_specs = []
+        for array in key_arrays:
+            shm, spec = to_shared(array)
+            blocks.append(shm)
+            key_specs.append(spec)
+        values_spec = None
+        if values is not None:
+            shm, values_spec = to_shared(values)
+            blocks.append(shm)
+
+        bounds = np.linspace(0, len(key_arrays[0]), (os.cpu_count() or 1) + 1).astype(int)
+        futures = [
+            get_executor().submit(partial_aggregate, key_specs, values_spec, start, stop, dropna, period)
+            for start, stop in zip(bounds[:-1], bounds[1:]) if stop > start
+        ]
+        partials = pd.concat([future.result() for future in futures])
+    finally:
+        for shm in blocks:
+            shm.close()
+            shm.unlink()
+    levels = list(range(partials.index.nlevels))
+    return partials.groupby(level=levels if len(levels) > 1 else 0, dropna=dropna).sum()
+
+
+def use_parallel(rows):
+    """Пул имеет смысл только на больших таблицах и при нескольких ядрах"""
+    return rows >= PARALLEL_THRESHOLD and (os.cpu_count() or 1) > 1
+
+
+def shareable(column):
+    """В разделяемую память передаются числа, даты и коды категорий; строки - нет"""
+    return isinstance(column.dtype, pd.CategoricalDtype) or (
+        column.dtype != object and not pd.api.types.is_string_dtype(column)
+    )
+
+
+def key_array(key):
+    if isinstance(key.dtype, pd.CategoricalDtype):
+        return key.cat.codes.to_numpy()
+    return key.to_numpy()
+
+
+def decode_keys(result, keys, dropna):
+    """Замена кодов категорий в индексе результата на сами значения"""
+    if not any(isinstance(key.dtype, pd.CategoricalDtype) for key in keys):
+        return result
+    arrays = []
+    present = np.ones(len(result), dtype=bool)
+    for i, key in enumerate(keys):
+        level = result.index.get_level_values(i)
+        if isinstance(key.dtype, pd.CategoricalDtype):
+            codes = level.to_numpy()
+            if dropna:
+                present &= codes >= 0
+            level = key.cat.categories.take(codes, allow_fill=True, fill_value=np.nan)
+        arrays.append(level)
+    if len(keys) == 1:
+        index = pd.Index(arrays[0], name=keys[0].name)
+    else:
+        index = pd.MultiIndex.from_arrays(arrays, names=[key.name for key in keys])
+    return result.set_axis(index)[present].sort_index()
+
+
+def sum_by(keys, values, dropna=True):
+    """Сумма values и количество строк по ключам (Series или список Series)"""
+    if isinstance(keys, pd.Series):
+        keys = [keys]
+    if not use_parallel(len(values)) or not all(shareable(key) for key in keys + [values]):
+        grouped = values.groupby(keys, dropna=dropna, observed=True)
+        return pd.DataFrame({'sum': grouped.sum(), 'count': grouped.size()})
+
+    result = aggregate_parallel([key_array(key) for key in keys], values.to_numpy(), dropna)
+    result = decode_keys(result, keys, dropna)
+    if len(keys) == 1:
+        result.index.name = keys[0].name
+    else:
+        result.index.names = [key.name for key in keys]
+    return result
+
+
+def count_by(key):
+    """Количество строк по значениям key, по убыванию (аналог value_counts)"""
+    if not use_parallel(len(key)) or not shareable(key):
+        counts = key.value_counts()
+        # Для категорий value_counts показывает и отсутствующие значения
+        return counts[counts > 0]
+    result = decode_keys(aggregate_parallel([key_array(key)], None), [key], True)
+    counts = result['count'].rename('count')
+    counts.index.name = key.name
+    return counts.sort_values(ascending=False)
+
+
+def sum_by_period(dates, values, period):
+    """Сумма values по дням ('D'), неделям ('W') или месяцам ('M')"""
+    if not use_parallel(len(values)) or not shareable(values):
+        if period == 'D':
+            return values.groupby(dates.dt.date).sum()
+        return values.groupby(dates.dt.to_period(period)).sum()
+
+    # Номер периода каждая партиция считает сама арифметикой по datetime64
+    timestamps = dates.to_numpy(dtype='datetime64[ns]').view(np.int64)
+    sums = aggregate_parallel([timestamps], values.to_numpy(), period=period)['sum']
+    ordinals = sums.index.to_numpy()
+    if period == 'M':
+        starts = ordinals.astype('datetime64[M]')
+    elif period == 'W':
+        starts = (ordinals * 7 - 3).astype('datetime64[D]')
+    else:
+        starts = ordinals.astype('datetime64[D]')
+    return pd.Series(sums.to_numpy(), index=pd.DatetimeIndex(starts).to_period(period))
@@ -0,0 +1,144 @@
+import os
+import json
+import numpy as np
+import pandas as pd
+
+META_FILE = 'meta.json'
+
+
+def store_generation(path):
+    """Номер поколения файлов текущего хранилища, 0 если его ещё нет"""
+    if not store_exists(path):
+        return 0
+    with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+        return json.load(f).get('generation', 0)
+
+
+def remove_old_generations(path, generation):
+    """Удаление файлов старше предыдущего поколения.
+
+    Предыдущее поколение оставляем: его мог только что открыть
+    просмотрщик, прочитавший старый meta.json. На Windows открытые
+    через mmap файлы удалить нельзя, они удалятся при следующем обновлении.
+    """
+    for name in os.listdir(path):
+        parts = name.rsplit('.', 2)
+        if len(parts) == 3 and parts[2] == 'bin' and parts[1].isdigit() and int(parts[1]) < generation - 1:
+            try:
+                os.remove(os.path.join(path, name))
+            except OSError:
+                pass
+
+
+def write_store(df, path, time_column):
+    """Запись таблицы по колонкам в сырые файлы фиксированной ширины.
+
+    Даты пишутся как int64 (наносекунды), строки как int32 коды категорий,
+    числа как float64/int64. Строки сортируются по time_column по
+    возрастанию, чтобы диапазон дат был непрерывным куском файла.
+    Строки без даты в хранилище не попадают.
+
+    Каждое обновление пишет файлы с новым номером поколения и атомарно
+    подменяет meta.json, поэтому уже открытые просмотрщики продолжают
+    читать свои старые файлы.
+    """
+    df = df.copy()
+    df[time_column] = pd.to_datetime(df[time_column])
+    df = df.dropna(subset=[time_column]).sort_values(time_column, kind='mergesort')
+    os.makedirs(path, exist_ok=True)
+    generation = store_generation(path) + 1
+
+    columns = []
+    for name in df.columns:
+        column = df[name]
+        meta = {'name': name, 'file': f'{name}.{generation}.bin'}
+        if pd.api.types.is_datetime64_any_dtype(column):
+            meta['kind'] = 'time'
+            data = column.to_numpy(dtype='datetime64[ns]').view(np.int64)
+        elif pd.api.types.is_numeric_dtype(column) and not pd.api.types.is_bool_dtype(column):
+            meta['kind'] = 'number'
+            data = column.to_numpy(dtype=np.int64 if pd.api.types.is_integer_dtype(column) else np.float64)
+        else:
+            meta['kind'] = 'category'
+            codes, categories = pd.factorize(column)
+            data = codes.astype(np.int32)
+            meta['categories'] = [str(value) for value in categories]
+        meta['dtype'] = data.dtype.str
+        data.tofile(os.path.join(path, meta['file']))
+        columns.append(meta)
+
+    # Новое описание подменяет старое одной операцией os.replace
+    tmp_meta = os.path.join(path, META_FILE + '.tmp')
+    with open(tmp_meta, 'w', encoding='utf-8') as f:
+        json.dump({'rows': len(df), 'time_column': time_column, 'generation': generation,
+                   'columns': columns}, f, ensure_ascii=False)
+    os.replace(tmp_meta, os.path.join(path, META_FILE))
+    remove_old_generations(path, generation)
+
+
+def store_exists(path):
+    return os.path.exists(os.path.join(path, META_FILE))
+
+
+def store_is_fresh(path, source_path):
+    """Хранилище есть и записано не раньше исходного CSV"""
+    if not store_exists(path):
+        return False
+    if not os.path.exists(source_path):
+        return True
+    return os.path.getmtime(os.path.join(path, META_FILE)) >= os.path.getmtime(source_path)
+
+
+class ColumnStore:
+    """Колонки таблицы, открытые через memory mapping.
+
+    Файлы читаются только в тех страницах, которые попали в выбранный
+    диапазон дат, и разделяются через page cache между процессами.
+    """
+    def __init__(self, path):
+        with open(os.path.join(path, META_FILE), encoding='utf-8') as f:
+            meta = json.load(f)
+        self.rows = meta['rows']
+        self.time_column = meta['time_column']
+        self.columns = meta['columns']
+        self.arrays = {}
+        self.categories = {}
+        for column in self.columns:
+            dtype = np.dtype(column['dtype'])
+            if self.rows == 0:
+                self.arrays[column['name']] = np.empty(0, dtype=dtype)
+            else:
+                self.arrays[column['name']] = np.memmap(os.path.join(path, column['file']),
+                                                        dtype=dtype, mode='r', shape=(self.rows,))
+            if column['kind'] == 'category':
+                self.categories[column['name']] = pd.Index(column['categories'])
+
+    def __len__(self):
+        return self.rows
+
+    def time_range(self):
+        """Первая и последняя дата в хранилище"""
+        times = self.arrays[self.time_column]
+        if self.rows == 0:
+            return pd.NaT, pd.NaT
+        return pd.Timestamp(int(times[0])), pd.Timestamp(int(times[-1]))
+
+    def between(self, start_date=None, end_date=None):
+        """Строки с датой в [start_date, end_date] как DataFrame"""
+        times = self.arrays[self.time_column]
+        lo = 0 if start_date is None else np.searchsorted(times, pd.Timestamp(start_date).value, side='left')
+        hi = self.rows if end_date is None else np.searchsorted(times, pd.Timestamp(end_date).value, side='right')
+
+        # Колонки остаются представлениями на mmap, без копии в память процесса
+        data = {}
+        for column in self.columns:
+            name = column['name']
+            part = self.arrays[name][lo:hi]
+            if column['kind'] == 'time':
+                data[name] = np.asarray(part).view('datetime64[ns]')
+            elif column['kind'] == 'category':
+                # Процесс держит только int32 коды, код -1 означает пропуск
+                data[name] = pd.Categorical.from_codes(np.asarray(part), categories=self.categories[name])
+            else:
+                data[name] = np.asarray(part)
+        return pd.DataFrame(data, copy=False)
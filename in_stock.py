@@ -4,10 +4,52 @@ import matplotlib.pyplot as plt
 from matplotlib.widgets import Button, TextBox, Slider
 from datetime import datetime, timedelta
 
+# Значение времени до истощения для товаров без продаж за неделю
+NO_SALES_HOURS = 9999
+
+
+def calculate_stockout_time(original_df, sales_df):
+    """Расчет времени до истощения запасов по продажам за последнюю неделю"""
+    forecast_df = original_df.copy()
+    one_week_ago = datetime.now() - timedelta(days=7)
+    hours_in_week = 7 * 24
+
+    # Средние продажи в час по каждому товару
+    week_sales = sales_df[sales_df['transaction_date'] >= one_week_ago]
+    avg_sales_per_hour = week_sales.groupby('product_id')['quantity'].sum() / hours_in_week
+    avg_sales_per_hour = forecast_df['product_id'].map(avg_sales_per_hour).fillna(0)
+
+    has_sales = avg_sales_per_hour > 0
+    hours_until_stockout = forecast_df['stock_quantity'] / avg_sales_per_hour.where(has_sales)
+    forecast_df['time_to_stockout_hours'] = hours_until_stockout.where(has_sales, NO_SALES_HOURS)
+
+    forecast_df['urgency_level'] = np.select(
+        [has_sales & (hours_until_stockout <= 24), has_sales & (hours_until_stockout <= 24 * 7)],
+        ['Критический', 'Средний'],
+        default='Низкий'
+    )
+    return forecast_df
+
+
+def build_forecast(original_df, sales_df):
+    """Готовая к показу таблица: все товары по срочности и отдельно критические"""
+    forecast_df = calculate_stockout_time(original_df, sales_df)
+    # Товары без продаж (NO_SALES_HOURS) и без остатка (NaN) идут в конец списка
+    forecast_df = forecast_df.sort_values(
+        'time_to_stockout_hours',
+        key=lambda hours: hours.where(hours != NO_SALES_HOURS),
+        na_position='last',
+        kind='mergesort'
+    ).reset_index(drop=True)
+    critical_df = forecast_df[forecast_df['urgency_level'] == 'Критический']
+    return forecast_df, critical_df
+
+
 class InventoryAnalyzer:
-    def __init__(self, orig_df, sales_df):
-        self.original_df = orig_df
-        self.sales_df = sales_df
+    def __init__(self, forecast_df, critical_df):
+        # Прогноз рассчитывается при обновлении таблиц, здесь только отображение
+        self.original_df = forecast_df
+        self.critical_df = critical_df
         self.analysis_df = self.original_df.copy()
         self.fig = None
         self.ax = None
@@ -15,7 +57,6 @@ class InventoryAnalyzer:
         self.visible_rows = 15
         self.total_rows = 0
         
-        self.calculate_stockout_time(sales_df)
         self.setup_ui()
 
         self.scroll_text = self.fig.text(0.1, 0.08, '', ha='left', fontsize=11,
@@ -24,48 +65,6 @@ class InventoryAnalyzer:
         self.stats_text = self.fig.text(0.5, 0.08, '', ha='center', fontsize=11,
                      bbox=dict(boxstyle="round,pad=0.3", facecolor="lightblue", alpha=0.8))
 
-    def calculate_stockout_time(self, sales_df):
-        """Расчет времени до истощения запасов"""
-        time_to_stockout_hours = []
-        urgency_levels = []
-        
-        for idx, row in self.original_df.iterrows():
-            product_id = row['product_id']
-            current_stock = row['stock_quantity']
-            
-            one_week_ago = datetime.now() - timedelta(days=7)
-            product_sales = sales_df[
-                (sales_df['product_id'] == product_id) & 
-                (sales_df['transaction_date'] >= one_week_ago)
-            ]
-            
-            if len(product_sales) == 0:
-                time_to_stockout_hours.append(9999)
-                urgency_levels.append('Низкий')
-                continue
-            
-            total_sold_week = product_sales['quantity'].sum()
-            hours_in_week = 7 * 24
-            avg_sales_per_hour = total_sold_week / hours_in_week
-            
-            if avg_sales_per_hour <= 0:
-                time_to_stockout_hours.append(9999)
-
-                urgency_levels.append('Низкий')
-            else:
-                hours_until_stockout = current_stock / avg_sales_per_hour
-                time_to_stockout_hours.append(hours_until_stockout)
-                
-                if hours_until_stockout <= 24:
-                    urgency_levels.append('Критический')
-                elif hours_until_stockout <= (24 * 7):
-                    urgency_levels.append('Средний')
-                else:
-                    urgency_levels.append('Низкий')
-        
-        self.original_df['time_to_stockout_hours'] = time_to_stockout_hours
-        self.original_df['urgency_level'] = urgency_levels
-    
     def setup_ui(self):
         """Настройка пользовательского интерфейса"""
         self.fig, self.ax = plt.subplots(figsize=(12, 8))
@@ -245,9 +244,7 @@ class InventoryAnalyzer:
     
     def show_critical_items(self, event):
         """Показать только критические товары (отсортированные по времени)"""
-        critical_df = self.original_df[self.original_df['urgency_level'] == 'Критический']
-        critical_df = critical_df.sort_values('time_to_stockout_hours', ascending=True)
-        self.analysis_df = critical_df.copy()
+        self.analysis_df = self.critical_df.copy()
         self.total_rows = len(self.analysis_df)
         self.scroll_position = 0
         self.display_table()
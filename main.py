@@ -1,7 +1,10 @@
+import os
 import pandas as pd
 import product_sales as ps
 import traffic as tr
 import in_stock as ist
+import returns as rt
+import column_store as cs
 from datetime import datetime
 
 # Загрузка данных и их передача в файл product_sales.csv для дальнейшего анализа
@@ -19,6 +22,8 @@ def product_sales_data_edit():
         prod_sales_df = prod_sales_df.sort_values('transaction_date', ascending=False)
         print('Сохраняем')
         prod_sales_df.to_csv('product-sales.csv', index=False, encoding='utf-8')
+        # Хранилище пишется после CSV: если запись не удалась, оно старше CSV и не используется
+        cs.write_store(prod_sales_df, 'product-sales.store', 'transaction_date')
     except Exception as e:
         print(f"Ошибка загрузки файлов: {e}")
  
@@ -30,6 +35,7 @@ def traffic_edit():
         trafficend = pd.DataFrame()
         trafficend = traffic_df[['customer_id', 'channel', 'session_start', 'device']].copy()
         trafficend.to_csv('trafficend.csv', index=False, encoding='utf-8')
+        cs.write_store(trafficend, 'trafficend.store', 'session_start')
     except Exception as e:
         print(f"Ошибка загрузки файлов: {e}")
  
@@ -55,67 +61,44 @@ def in_stock_edit():
     except Exception as e:
         print(f"Ошибка загрузки файлов: {e}")
 
+#Прогноз остатков и его передача в inventory-forecast.csv и inventory-critical.csv
+def in_stock_forecast_edit():
+    try:
+        original_df, sales_df = in_stock_edit()
+        forecast_df, critical_df = ist.build_forecast(original_df, sales_df)
+        forecast_df.to_csv('inventory-forecast.csv', index=False, encoding='utf-8')
+        critical_df.to_csv('inventory-critical.csv', index=False, encoding='utf-8')
+    except Exception as e:
+        print(f"Ошибка загрузки файлов: {e}")
+
+
+#Загрузка готового прогноза остатков
+def in_stock_load():
+    # Таблицы еще не обновлялись - один раз считаем прогноз на месте
+    if not os.path.exists('inventory-critical.csv'):
+        in_stock_forecast_edit()
+    try:
+        forecast_df = pd.read_csv('inventory-forecast.csv', sep=',', encoding='utf-8')
+        critical_df = pd.read_csv('inventory-critical.csv', sep=',', encoding='utf-8')
+        return forecast_df, critical_df
+    except Exception as e:
+        print(f"Ошибка загрузки файлов: {e}")
+
+
 #Загрузка данных для возвратов
-def returns_edit():
-    returns = pd.read_csv('returns.csv')
-    sales = pd.read_csv('sales.csv')
-    returns_with_quantity = returns.merge(
-        sales[['transaction_id', 'quantity', 'customer_id']],
-        left_on='transaction_id',
-        right_on='transaction_id',
-        how='left'
-        )
-    # Первая таблица
-    # Общее количество купленных товаров по клиентам
-    customer_orders = sales.groupby('customer_id')['quantity'].sum().reset_index()
-    customer_orders.columns = ['customer_id', 'orders_value']
-    # Количество возвращенных товаров по клиентам
-    customer_returns = returns_with_quantity.groupby('customer_id')["quantity"].sum().reset_index()
-    customer_returns.columns = ['customer_id', 'returns_value']
-    # Объединяем и
-    customer_stats = customer_orders.merge(customer_returns, on='customer_id', how='left')
-    customer_stats['returns_value'] = customer_stats['returns_value'].fillna(0)
-    # Процент выкупа
-    customer_stats['percent_buyout'] = (
-            (customer_stats['orders_value'] - customer_stats['returns_value']) /
-            customer_stats['orders_value'] * 100
-    ).round(2)
-
-    # ВТОРАЯ ТАБЛИЦА
-    # Количество возвратов по товарам
-    product_returns = returns_with_quantity.groupby('product_id')['quantity'].sum().reset_index()
-    product_returns.columns = ['product_id', 'value_return']
-
-    # Самая популярная причина возврата
-    def get_most_common_reason(group):
-        if group['reason'].empty:
-            return 'No returns'
-        return group['reason'].mode()[0]
-
-    common_reasons = returns.groupby('product_id').apply(
-        get_most_common_reason,
-        include_groups=False
-    ).reset_index()
-    common_reasons.columns = ['product_id', 'common_cause']
-
-
-    # Объединяем
-    product_stats = product_returns.merge(common_reasons, on='product_id', how='outer')
-    product_stats['value_return'] = product_stats['value_return'].fillna(0)
-    product_stats['common_cause'] = product_stats['common_cause'].fillna('No returns')
-
-    customer_stats_filename = f'customer_returns_stats.csv'
-    product_stats_filename = f'product_returns_stats.csv'
-
-    # Сохраняем таблицы
-    customer_stats.to_csv(customer_stats_filename, index=False, encoding='utf-8')
-    product_stats.to_csv(product_stats_filename, index=False, encoding='utf-8')
-
-    print(f"\nКолонки после объединения:")
-    print(returns_with_quantity.columns.tolist())
-    print(customer_orders.columns.tolist())
-    print(customer_returns.columns.tolist())
-    print(customer_stats.columns.tolist())
+def returns_edit(full=False):
+    try:
+        # Агрегаты хранятся между запусками и дополняются только новыми строками sales/returns
+        customer_stats, product_stats = rt.update('sales.csv', 'returns.csv', full=full)
+
+        customer_stats_filename = f'customer_returns_stats.csv'
+        product_stats_filename = f'product_returns_stats.csv'
+
+        # Сохраняем таблицы
+        customer_stats.to_csv(customer_stats_filename, index=False, encoding='utf-8')
+        product_stats.to_csv(product_stats_filename, index=False, encoding='utf-8')
+    except Exception as e:
+        print(f"Ошибка загрузки файлов: {e}")
 
 if __name__ == "__main__":
     while True:
@@ -129,16 +112,26 @@ if __name__ == "__main__":
         choice = input("Введите номер: ").strip()
 
         if choice == '1':
-            prod_sales_df = pd.read_csv('product-sales.csv')
+            # Колоночное хранилище открывается через mmap без загрузки всей таблицы,
+            # если CSV новее хранилища - показываем CSV
+            if cs.store_is_fresh('product-sales.store', 'product-sales.csv'):
+                prod_sales_df = cs.ColumnStore('product-sales.store')
+            else:
+                prod_sales_df = pd.read_csv('product-sales.csv', dtype={'category': 'category', 'payment_method': 'category'})
             ps.start(prod_sales_df) # открытие графика продуктов/продаж
         elif choice == '2':
-            trafficend = pd.read_csv('trafficend.csv')
+            if cs.store_is_fresh('trafficend.store', 'trafficend.csv'):
+                trafficend = cs.ColumnStore('trafficend.store')
+            else:
+                trafficend = pd.read_csv('trafficend.csv', dtype={'channel': 'category', 'device': 'category'})
             tr.start(trafficend)
         elif choice == '3':
-            ist.start(in_stock_edit())
+            ist.start(in_stock_load())
         elif choice == '9':
             product_sales_data_edit() #  создание таблицы для product-sales
             traffic_edit()        #создание таблицы для трафика
+            returns_edit()        #инкрементальное обновление статистики возвратов
+            in_stock_forecast_edit()  #создание готовой таблицы прогноза остатков
 
 
         elif choice == '0':
@@ -2,17 +2,26 @@ import pandas as pd
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Button, TextBox
 from datetime import timedelta
+import aggregation as ag
+import column_store as cs
 
 class SalesAnalyzer:
     def __init__(self, prod_sales_df):
-        self.df = prod_sales_df
-        self.df['transaction_date'] = pd.to_datetime(self.df['transaction_date'])
-        self.current_data = pd.DataFrame(self.df)
+        # Данные либо DataFrame в памяти, либо колоночное хранилище на диске
+        if isinstance(prod_sales_df, cs.ColumnStore):
+            self.store = prod_sales_df
+            self.df = None
+            self.start_date, self.end_date = self.store.time_range()
+        else:
+            self.store = None
+            self.df = prod_sales_df
+            self.df['transaction_date'] = pd.to_datetime(self.df['transaction_date'])
+            self.start_date = self.df['transaction_date'].min()
+            self.end_date = self.df['transaction_date'].max()
+        self.current_data = None  # заполняется в filter_data при настройке интерфейса
         self.current_chart_type = 'daily' 
         self.fig = None
         self.ax = None
-        self.start_date = prod_sales_df['transaction_date'].min()
-        self.end_date = prod_sales_df['transaction_date'].max()
         self.period_label = '(все данные)'
         self.setup_ui()
 
@@ -74,6 +83,17 @@ class SalesAnalyzer:
         self.filter_data('week')
         self.plot_chart('daily')
 
+    def select(self, start_date=None, end_date=None):
+        """Продажи за период; из хранилища читаются только нужные страницы"""
+        if self.store is not None:
+            return self.store.between(start_date, end_date)
+        data = self.df
+        if start_date is not None:
+            data = data[data['transaction_date'] >= start_date]
+        if end_date is not None:
+            data = data[data['transaction_date'] <= end_date]
+        return data
+
     def apply_custom_dates(self):
         """Применяет выбранные даты при нажатии кнопки"""
         try:
@@ -82,10 +102,7 @@ class SalesAnalyzer:
             if start_date > end_date:
                 raise ValueError("Начальная дата не может быть больше конечной")
                 
-            self.current_data = self.df[
-                (self.df['transaction_date'] >= start_date) & 
-                (self.df['transaction_date'] <= end_date)
-            ]
+            self.current_data = self.select(start_date, end_date)
             self.period_label = f' ({end_date.strftime("%Y-%m-%d")} - {start_date.strftime("%Y-%m-%d")})'
             self.update_info()
             self.plot_chart(self.current_chart_type)
@@ -104,7 +121,7 @@ class SalesAnalyzer:
             """Установка периода в зависимости от входных дней(неделя, месяц, сезон)
             """
             start_date = max_date - timedelta(days=days)
-            self.current_data = self.df[self.df['transaction_date'] >= start_date]
+            self.current_data = self.select(start_date)
             self.period_label = f' (последние {days} дней)'
             self.start_text.set_val(start_date.strftime('%Y-%m-%d'))
             self.end_text.set_val(max_date.strftime('%Y-%m-%d'))
@@ -121,7 +138,7 @@ class SalesAnalyzer:
             period_filter(max_date, 90)
 
         else:  # all
-            self.current_data = self.df
+            self.current_data = self.select()
             self.period_label = ' (все данные)'
             self.start_text.set_val(self.start_date.strftime('%Y-%m-%d'))
             self.end_text.set_val(self.end_date.strftime('%Y-%m-%d'))
@@ -140,12 +157,8 @@ class SalesAnalyzer:
             return
             
         def period_filter_plot(period):
-            if period == 'daily':
-                sales_data = self.current_data.groupby(self.current_data['transaction_date'].dt.date)['summary_price'].sum()
-            elif period == 'weekly':
-                sales_data = self.current_data.groupby(self.current_data['transaction_date'].dt.to_period('W'))['summary_price'].sum()
-            elif period == 'monthly':
-                sales_data = self.current_data.groupby(self.current_data['transaction_date'].dt.to_period('M'))['summary_price'].sum()
+            freq = {'daily': 'D', 'weekly': 'W', 'monthly': 'M'}[period]
+            sales_data = ag.sum_by_period(self.current_data['transaction_date'], self.current_data['summary_price'], freq)
             self.ax.bar(sales_data.index.astype(str), sales_data.values, color="#DA5FF0", alpha=0.95)
             self.ax.tick_params(axis='x', rotation=45)
         
@@ -163,7 +176,7 @@ class SalesAnalyzer:
             
         elif chart_type == 'category':
             # данные по категориям
-            sales_data = self.current_data.groupby('category')['summary_price'].sum().sort_values(ascending=False)
+            sales_data = ag.sum_by(self.current_data['category'], self.current_data['summary_price'])['sum'].sort_values(ascending=False)
             self.ax.bar(sales_data.index, sales_data.values, color='#96CEB4', alpha=0.95)
             title = 'Продажи по категориям'
             self.ax.tick_params(axis='x', rotation=45)
@@ -1 +1,319 @@
-import pandas as pd
\ No newline at end of file
+import io
+import os
+import glob
+import shutil
+import numpy as np
+import pandas as pd
+import aggregation as ag
+
+# Состояние агрегатов по возвратам: каталог на каждое поколение и указатель на текущее
+STATE_DIR = 'returns_state'
+CURRENT_FILE = os.path.join(STATE_DIR, 'current.txt')
+# Справочник transaction_id -> (customer_id, quantity), по сегменту на каждый запуск
+SALES_STATE_DIR = os.path.join(STATE_DIR, 'sales')
+# Когда сегментов становится больше, они сливаются в один
+MAX_SALES_SEGMENTS = 32
+# Сколько байт перед смещением запоминаем, чтобы заметить перезаписанный файл
+CHECK_BYTES = 64
+# Сколько запусков возврат ждёт свою продажу, прежде чем его клиентская часть отбрасывается
+MAX_PENDING_RUNS = 30
+
+SALES_COLUMNS = ['transaction_id', 'quantity', 'customer_id']
+PENDING_COLUMNS = ['transaction_id', 'product_id', 'reason', 'pending_runs']
+
+
+def empty_state():
+    customers = pd.DataFrame({
+        'customer_id': pd.Series(dtype='int64'),
+        'orders_value': pd.Series(dtype='int64'),
+        'returns_value': pd.Series(dtype='int64'),
+    })
+    products = pd.DataFrame({
+        'product_id': pd.Series(dtype='int64'),
+        'reason': pd.Series(dtype=object),
+        'returns_count': pd.Series(dtype='int64'),
+        'value_return': pd.Series(dtype='int64'),
+    })
+    pending = pd.DataFrame(columns=PENDING_COLUMNS)
+    offsets = {'sales': 0, 'sales_check': '', 'returns': 0, 'returns_check': ''}
+    return customers, products, pending, offsets
+
+
+def current_generation():
+    """Номер текущего поколения состояния, 0 если состояния нет"""
+    if not os.path.exists(CURRENT_FILE):
+        return 0
+    with open(CURRENT_FILE, encoding='utf-8') as f:
+        return int(f.read().strip())
+
+
+def generation_dir(generation):
+    return os.path.join(STATE_DIR, f'{generation:06d}')
+
+
+def reset_state():
+    """Удаление накопленного состояния для пересчета с нуля"""
+    # Сначала указатель: без него оставшиеся файлы уже не считаются состоянием
+    if os.path.exists(CURRENT_FILE):
+        os.remove(CURRENT_FILE)
+    for path in glob.glob(os.path.join(SALES_STATE_DIR, '*.npy')):
+        os.remove(path)
+
+
+def file_check(path, offset):
+    """Последние CHECK_BYTES байт перед смещением в виде hex-строки"""
+    with open(path, 'rb') as f:
+        f.seek(max(0, offset - CHECK_BYTES))
+        return f.read(min(offset, CHECK_BYTES)).hex()
+
+
+def offset_valid(path, offset, check):
+    """Файл только дополнялся: он не короче смещения и байты перед ним не изменились"""
+    return os.path.getsize(path) >= offset and file_check(path, offset) == check
+
+
+def load_state(sales_path, returns_path):
+    """Загрузка накопленных агрегатов, отложенных возвратов и смещений в файлах"""
+    generation = current_generation()
+    if generation == 0:
+        return empty_state()
+    state_dir = generation_dir(generation)
+
+    offsets = pd.read_csv(os.path.join(state_dir, 'offsets.csv'), dtype=str,
+                          keep_default_na=False, encoding='utf-8').iloc[0].to_dict()
+    for name, path in (('sales', sales_path), ('returns', returns_path)):
+        if not offset_valid(path, int(offsets[name]), offsets[f'{name}_check']):
+            print(f"Файл {path} был перезаписан, статистика возвратов пересчитывается заново")
+            reset_state()
+            return empty_state()
+    offsets['sales'] = int(offsets['sales'])
+    offsets['returns'] = int(offsets['returns'])
+
+    customers = pd.read_csv(os.path.join(state_dir, 'customers.csv'), encoding='utf-8')
+    products = pd.read_csv(os.path.join(state_dir, 'products.csv'), encoding='utf-8')
+    pending = pd.read_csv(os.path.join(state_dir, 'pending.csv'), encoding='utf-8')
+    return customers, products, pending, offsets
+
+
+def save_state(customers, products, pending, offsets):
+    """Запись состояния в новое поколение и атомарное переключение на него.
+
+    Пока указатель не подменён через os.replace, следующий запуск видит
+    прежние агрегаты вместе с прежними смещениями, поэтому сбой во время
+    записи не приводит к повторному учёту строк.
+    """
+    generation = current_generation() + 1
+    state_dir = generation_dir(generation)
+    os.makedirs(state_dir, exist_ok=True)
+    customers.to_csv(os.path.join(state_dir, 'customers.csv'), index=False, encoding='utf-8')
+    products.to_csv(os.path.join(state_dir, 'products.csv'), index=False, encoding='utf-8')
+    pending.to_csv(os.path.join(state_dir, 'pending.csv'), index=False, encoding='utf-8')
+    pd.DataFrame([offsets]).to_csv(os.path.join(state_dir, 'offsets.csv'), index=False, encoding='utf-8')
+
+    tmp_current = CURRENT_FILE + '.tmp'
+    with open(tmp_current, 'w', encoding='utf-8') as f:
+        f.write(str(generation))
+    os.replace(tmp_current, CURRENT_FILE)
+
+    for name in os.listdir(STATE_DIR):
+        if name.isdigit() and int(name) != generation:
+            shutil.rmtree(os.path.join(STATE_DIR, name), ignore_errors=True)
+
+
+def read_new_rows(path, offset):
+    """Чтение строк, дописанных в файл после байтового смещения offset.
+
+    Возвращает таблицу и новое смещение; уже учтённая часть файла не читается.
+    Недописанная последняя строка без перевода строки остаётся до следующего запуска.
+    """
+    with open(path, 'rb') as f:
+        header = f.readline()
+        columns = pd.read_csv(io.BytesIO(header), encoding='utf-8').columns
+        start = max(offset, len(header))
+        f.seek(start)
+        data = f.read()
+    data = data[:data.rfind(b'\n') + 1]
+    if not data.strip():
+        return pd.DataFrame(columns=columns), start + len(data)
+    new_rows = pd.read_csv(io.BytesIO(data), header=None, names=columns, encoding='utf-8')
+    return new_rows, start + len(data)
+
+
+def sales_array(column):
+    """Колонка как массив фиксированной ширины, который можно открыть через mmap"""
+    array = column.to_numpy()
+    if array.dtype == object:
+        array = array.astype(str)
+    return array
+
+
+def load_sales_segments():
+    """Сегменты справочника продаж, открытые через mmap"""
+    segments = []
+    for ids_path in sorted(glob.glob(os.path.join(SALES_STATE_DIR, '*_transaction_id.npy'))):
+        prefix = ids_path[:-len('transaction_id.npy')]
+        segments.append({column: np.load(f'{prefix}{column}.npy', mmap_mode='r') for column in SALES_COLUMNS})
+    return segments
+
+
+def write_sales_segment(number, sales):
+    sales = sales.sort_values('transaction_id', kind='mergesort')
+    for column in SALES_COLUMNS:
+        np.save(os.path.join(SALES_STATE_DIR, f'{number:06d}_{column}.npy'), sales_array(sales[column]))
+
+
+def save_sales_segment(new_sales):
+    """Добавление новых продаж в справочник; старые продажи больше не перечитываются"""
+    if new_sales.empty:
+        return
+    os.makedirs(SALES_STATE_DIR, exist_ok=True)
+    old_paths = sorted(glob.glob(os.path.join(SALES_STATE_DIR, '*.npy')))
+    numbers = [int(os.path.basename(path).split('_')[0]) for path in old_paths]
+    number = max(numbers, default=0) + 1
+
+    if len(set(numbers)) < MAX_SALES_SEGMENTS:
+        write_sales_segment(number, new_sales[SALES_COLUMNS])
+        return
+
+    # Сливаем все сегменты в один, чтобы поиск не проходил по сотням файлов
+    parts = [pd.DataFrame({column: np.asarray(segment[column]) for column in SALES_COLUMNS})
+             for segment in load_sales_segments()]
+    merged = pd.concat(parts + [new_sales[SALES_COLUMNS]], ignore_index=True)
+    write_sales_segment(number, merged.drop_duplicates('transaction_id', keep='last'))
+    for path in old_paths:
+        os.remove(path)
+
+
+def lookup_sales(transaction_ids):
+    """customer_id и quantity для транзакций по справочнику продаж.
+
+    Каждый сегмент отсортирован по transaction_id, поэтому поиск
+    читает только нужные страницы файлов.
+    """
+    ids = sales_array(pd.Series(transaction_ids).drop_duplicates())
+    parts = []
+    for segment in load_sales_segments():
+        segment_ids = segment['transaction_id']
+        positions = np.searchsorted(segment_ids, ids)
+        found = positions < len(segment_ids)
+        found[found] = segment_ids[positions[found]] == ids[found]
+        parts.append(pd.DataFrame({column: np.asarray(segment[column][positions[found]])
+                                   for column in SALES_COLUMNS}))
+    if not parts:
+        return pd.DataFrame(columns=SALES_COLUMNS)
+    # При повторе после сбоя одна продажа может оказаться в двух сегментах
+    return pd.concat(parts, ignore_index=True).drop_duplicates('transaction_id', keep='last')
+
+
+def quantity_dtype(new_sales, customers):
+    """Тип количества товара: из новых продаж, иначе из уже накопленных сумм"""
+    for column in (new_sales['quantity'], customers['orders_value']):
+        if len(column) and pd.api.types.is_numeric_dtype(column):
+            return column.dtype
+    return np.dtype('int64')
+
+
+def update_state(customers, products, new_sales, new_returns, returns_with_quantity):
+    """Добавление к агрегатам вкладов новых продаж и возвратов.
+
+    Число возвратов по паре (товар, причина) учитывается сразу по всем
+    новым возвратам, количество товара и клиент - по возвратам, для
+    которых уже известна продажа.
+    """
+    dtype = quantity_dtype(new_sales, customers)
+
+    # Сумма купленных и возвращённых товаров по клиентам
+    orders = ag.sum_by(new_sales['customer_id'], new_sales['quantity'])['sum'].rename('orders_value')
+    returned = ag.sum_by(returns_with_quantity['customer_id'], returns_with_quantity['quantity'])['sum'].rename('returns_value')
+    delta = pd.concat([orders, returned], axis=1).fillna(0)
+    customers = (
+        pd.concat([customers.set_index('customer_id'), delta])
+        .groupby(level=0).sum()
+        .rename_axis('customer_id').reset_index()
+    )
+    customers[['orders_value', 'returns_value']] = customers[['orders_value', 'returns_value']].astype(dtype)
+
+    # Количество возвратов и возвращённых товаров по паре (товар, причина)
+    counts = new_returns.groupby(['product_id', 'reason'], dropna=False).size().rename('returns_count')
+    quantities = ag.sum_by(
+        [returns_with_quantity['product_id'], returns_with_quantity['reason']],
+        returns_with_quantity['quantity'],
+        dropna=False
+    )['sum'].rename('value_return')
+    reasons = pd.concat([counts, quantities], axis=1).fillna(0).rename_axis(['product_id', 'reason']).reset_index()
+    products = (
+        pd.concat([products, reasons], ignore_index=True)
+        .groupby(['product_id', 'reason'], dropna=False)[['returns_count', 'value_return']].sum()
+        .reset_index()
+    )
+    products['returns_count'] = products['returns_count'].astype('int64')
+    products['value_return'] = products['value_return'].astype(dtype)
+    return customers, products
+
+
+def customer_stats_from_state(customers):
+    """Первая таблица: выкуп по клиентам"""
+    customer_stats = customers[['customer_id', 'orders_value', 'returns_value']].sort_values('customer_id')
+    # Процент выкупа
+    customer_stats['percent_buyout'] = (
+            (customer_stats['orders_value'] - customer_stats['returns_value']) /
+            customer_stats['orders_value'] * 100
+    ).round(2)
+    return customer_stats.reset_index(drop=True)
+
+
+def product_stats_from_state(products):
+    """Вторая таблица: возвраты и самая частая причина по товарам"""
+    value_return = products.groupby('product_id')['value_return'].sum()
+
+    # При равенстве частот берём первую по алфавиту причину, как Series.mode()
+    with_reason = products.dropna(subset=['product_id', 'reason']).sort_values(
+        ['product_id', 'returns_count', 'reason'], ascending=[True, False, True])
+    common_cause = with_reason.drop_duplicates('product_id').set_index('product_id')['reason']
+
+    product_stats = pd.DataFrame({'value_return': value_return, 'common_cause': common_cause})
+    product_stats = product_stats.rename_axis('product_id').reset_index()
+    product_stats['value_return'] = product_stats['value_return'].fillna(0)
+    product_stats['common_cause'] = product_stats['common_cause'].fillna('No returns')
+    return product_stats
+
+
+def update(sales_path='sales.csv', returns_path='returns.csv', full=False):
+    """Инкрементальное обновление агрегатов по новым строкам sales/returns.
+
+    Файлы продаж и возвратов только дополняются, поэтому достаточно
+    помнить байтовое смещение в каждом. Если файл был перезаписан или
+    укорочен, либо передан full=True, состояние пересчитывается с нуля.
+    """
+    if full:
+        reset_state()
+    customers, products, pending, offsets = load_state(sales_path, returns_path)
+
+    new_sales, sales_offset = read_new_rows(sales_path, offsets['sales'])
+    new_returns, returns_offset = read_new_rows(returns_path, offsets['returns'])
+    save_sales_segment(new_sales)
+
+    # Клиент и количество товара известны только после появления продажи,
+    # до этого возврат ждёт в pending не дольше MAX_PENDING_RUNS запусков
+    waiting = new_returns[PENDING_COLUMNS[:-1]].assign(pending_runs=0)
+    if not pending.empty:
+        waiting = pd.concat([pending, waiting], ignore_index=True)
+    sales = lookup_sales(waiting['transaction_id'])
+    matched = waiting['transaction_id'].isin(sales['transaction_id'])
+    returns_with_quantity = waiting[matched].merge(sales, on='transaction_id', how='left')
+    pending = waiting[~matched].assign(pending_runs=lambda df: df['pending_runs'] + 1)
+    expired = pending['pending_runs'] > MAX_PENDING_RUNS
+    pending = pending[~expired]
+
+    customers, products = update_state(customers, products, new_sales, new_returns, returns_with_quantity)
+    offsets = {
+        'sales': sales_offset,
+        'sales_check': file_check(sales_path, sales_offset),
+        'returns': returns_offset,
+        'returns_check': file_check(returns_path, returns_offset),
+    }
+    save_state(customers, products, pending, offsets)
+    print(f"Учтено новых продаж: {len(new_sales)}, возвратов: {len(new_returns)}, "
+          f"ожидают продажи: {len(pending)}, без продажи отброшено: {expired.sum()}")
+
+    return customer_stats_from_state(customers), product_stats_from_state(products)
@@ -2,14 +2,23 @@ import pandas as pd
 import numpy as np
 import matplotlib.pyplot as plt
 from matplotlib.widgets import Button, RadioButtons, TextBox
+import aggregation as ag
+import column_store as cs
 
 class TrafficVisualizer:
     def __init__(self, traffic_df):
-        self.data = traffic_df
-        self.data['session_start'] = pd.to_datetime(self.data['session_start'])
+        # Данные либо DataFrame в памяти, либо колоночное хранилище на диске
+        if isinstance(traffic_df, cs.ColumnStore):
+            self.store = traffic_df
+            self.data = None
+            self.start_date, self.end_date = self.store.time_range()
+        else:
+            self.store = None
+            self.data = traffic_df
+            self.data['session_start'] = pd.to_datetime(self.data['session_start'])
+            self.start_date = self.data['session_start'].min()
+            self.end_date = self.data['session_start'].max()
         self.filter_type = 'channel'
-        self.start_date = traffic_df['session_start'].min()
-        self.end_date = traffic_df['session_start'].max()
         
         self.fig, self.ax = plt.subplots(figsize=(12, 8))
         plt.subplots_adjust(bottom=0.25 )
@@ -43,6 +52,15 @@ class TrafficVisualizer:
     def on_date_change(self, text):
         self.update_plot()
         
+    def select(self, start_date, end_date):
+        """Сессии за период; из хранилища читаются только нужные страницы"""
+        if self.store is not None:
+            return self.store.between(start_date, end_date)
+        return self.data[
+            (self.data['session_start'] >= start_date) & 
+            (self.data['session_start'] <= end_date)
+        ]
+
     def update_plot(self):
         try:
             # Получение дат из текстовых полей
@@ -53,18 +71,15 @@ class TrafficVisualizer:
             self.end_text.set_val(end_date.strftime('%Y-%m-%d'))
             
             # Фильтрация данных по дате
-            filtered_data = self.data[
-                (self.data['session_start'] >= start_date) & 
-                (self.data['session_start'] <= end_date)
-            ]
+            filtered_data = self.select(start_date, end_date)
             
             # Группировка данных в зависимости от выбранного фильтра
             if self.filter_type == 'channel':
-                grouped_data = filtered_data['channel'].value_counts()
+                grouped_data = ag.count_by(filtered_data['channel'])
                 x_label = 'Каналы'
                 title = 'Посетители с каналов'
             else:
-                grouped_data = filtered_data['device'].value_counts()
+                grouped_data = ag.count_by(filtered_data['device'])
                 x_label = 'Устройства'
                 title = 'Посетители с устройств'
             